@@ -1,7 +1,10 @@
 import gymnasium as gym
+import numpy as np
 import sys
 import os
+import time
 from airplane_boarding import AirplaneEnv
+from telemetry import StepTimer, TimedVecEnv, ThroughputTelemetryCallback
 from sb3_contrib import MaskablePPO
 from sb3_contrib.common.maskable.utils import get_action_masks
 
@@ -17,7 +20,9 @@ log_dir = "logs"
 
 def train():
 
-    env = make_vec_env(AirplaneEnv, n_envs=12, env_kwargs={"num_of_rows":10, "seats_per_row":5}, vec_env_cls=SubprocVecEnv)
+    # StepTimer and TimedVecEnv feed the timings of ThroughputTelemetryCallback
+    env = make_vec_env(AirplaneEnv, n_envs=12, env_kwargs={"num_of_rows":10, "seats_per_row":5}, vec_env_cls=SubprocVecEnv, wrapper_class=StepTimer)
+    env = TimedVecEnv(env)
 
     # Increase ent_coef to encourage exploration, this resulted in a better solution.
     model = MaskablePPO('MlpPolicy', env, verbose=1, device='cpu', tensorboard_log=log_dir, ent_coef=0.05)
@@ -35,7 +40,7 @@ def train():
     total_timesteps: pass in a very large number to train (almost) indefinitely.
     callback: pass in reference to a callback fuction above
     """
-    model.learn(total_timesteps=int(1e10), callback=eval_callback)
+    model.learn(total_timesteps=int(1e10), callback=ThroughputTelemetryCallback(eval_callback))
 
 def test(model_name, render=True):
 
@@ -60,5 +65,39 @@ def test(model_name, render=True):
 
     print(f"Total rewards: {rewards}")
 
+def stream(model_name, arrival_rate=0.5, seed=None):
+
+    # Passengers arrive at the gate over time instead of all being present at reset
+    env = gym.make('airplane-boarding-v0', num_of_rows=10, seats_per_row=5, arrival_rate=arrival_rate, render_mode=None)
+
+    # Load model
+    model = MaskablePPO.load(f'models/MaskablePPO/{model_name}', env=env)
+
+    rewards = 0
+    latencies = []
+    obs, info = env.reset(seed=seed)
+    num_arrived = len(info["arrivals"])
+
+    while True:
+        start = time.perf_counter()
+        action_masks = get_action_masks(env)
+        action, _ = model.predict(observation=obs, deterministic=True, action_masks=action_masks)
+
+        # Every passenger that arrived since the last decision waited on this one
+        latencies += [time.perf_counter() - start] * num_arrived
+
+        obs, reward, terminated, _, info = env.step(action)
+        rewards += reward
+        num_arrived = len(info["arrivals"])
+
+        if terminated:
+            break
+
+    latencies = np.array(latencies) * 1000
+    print(f"Total rewards: {rewards}")
+    print(f"Decision latency per arrival ({len(latencies)} arrivals): "
+          f"mean {latencies.mean():.3f} ms, p50 {np.percentile(latencies, 50):.3f} ms, "
+          f"p99 {np.percentile(latencies, 99):.3f} ms, max {latencies.max():.3f} ms")
+
 if __name__ == '__main__':
     train()
\ No newline at end of file
@@ -2,6 +2,7 @@ import gymnasium as gym
 from gymnasium import spaces
 from gymnasium.envs.registration import register
 from enum import Enum
+from collections import deque
 import numpy as np
 
 # Register this module as a gym environment. Once registered, the id is usable in gym.make().
@@ -36,20 +37,55 @@ class Passenger:
         self.is_holding_luggage = True
         self.status = PassengerStatus.MOVING
 
+    # Returns the passenger to the state it had before boarding
+    def reset(self):
+        self.is_holding_luggage = True
+        self.status = PassengerStatus.MOVING
+
     # Returns the string representation of the Passenger class i.e. 2 digit seat number
     def __str__(self):
         return f"P{self.seat_num:02d}"
 
 class LobbyRow:
-    def __init__(self, row_num, seats_per_row):
+    def __init__(self, row_num, seats_per_row, passengers=None):
         self.row_num = row_num
-        self.passengers = [Passenger(row_num * seats_per_row + i, row_num) for i in range(seats_per_row)]
+        self.passengers = [Passenger(row_num * seats_per_row + i, row_num) for i in range(seats_per_row)] if passengers is None else passengers
 
 class Lobby:
-    def __init__(self, num_of_rows, seats_per_row):
+    def __init__(self, num_of_rows, seats_per_row, arrival_schedule=None, passengers=None):
         self.num_of_rows = num_of_rows
         self.seats_per_row = seats_per_row
-        self.lobby_rows = [LobbyRow(row_num, self.seats_per_row) for row_num in range(self.num_of_rows)]
+
+        # Passengers indexed by seat number, reuses the given ones instead of creating new ones
+        if passengers is None:
+            passengers = [Passenger(seat_num, seat_num // seats_per_row) for seat_num in range(num_of_rows * seats_per_row)]
+
+        # Without an arrival schedule, every passenger is in the lobby from the start
+        is_streaming = arrival_schedule is not None
+        self.lobby_rows = [
+            LobbyRow(row_num, self.seats_per_row, [] if is_streaming else passengers[row_num * seats_per_row:(row_num + 1) * seats_per_row])
+            for row_num in range(self.num_of_rows)
+        ]
+
+        # Passengers that haven't arrived at the gate yet, as (tick, passenger) in order of arrival
+        self.arrivals = deque()
+        if is_streaming:
+            seat_nums = [seat_num for _, seat_num in arrival_schedule]
+            assert len(set(seat_nums)) == len(seat_nums), "Arrival schedule contains duplicate seat numbers"
+            assert all(0 <= seat_num < num_of_rows * seats_per_row for seat_num in seat_nums), "Arrival schedule contains invalid seat numbers"
+
+            for tick, seat_num in sorted(arrival_schedule):
+                self.arrivals.append((tick, passengers[seat_num]))
+
+    # Moves the passengers that arrived by the given tick into their lobby row
+    def admit_arrivals(self, tick):
+        arrived = []
+        while len(self.arrivals) > 0 and self.arrivals[0][0] <= tick:
+            _, passenger = self.arrivals.popleft()
+            self.lobby_rows[passenger.row_num].passengers.append(passenger)
+            arrived.append(passenger)
+
+        return arrived
 
     def remove_passenger(self, row_num):
         passenger = self.lobby_rows[row_num].passengers.pop()
@@ -66,36 +102,57 @@ class BoardingLine:
     def __init__(self, num_of_rows):
         # Initialize the aisle
         self.num_of_rows = num_of_rows
-        self.line = [None for i in range(num_of_rows)]
+        self.aisle = [None for i in range(num_of_rows)]
+
+        # Passengers waiting outside of the airplane's door, front of the queue first.
+        # The queue is always one contiguous block right behind the last aisle spot: a passenger
+        # only moves when the spot in front is empty, so the whole block either advances together
+        # or stalls together. That lets us store it as a deque with a single shared status.
+        self.queue = deque()
+        self.queue_status = PassengerStatus.MOVING
+
+    # Returns the full line (aisle followed by the queue outside of the airplane)
+    @property
+    def line(self):
+        for passenger in self.queue:
+            passenger.status = self.queue_status
+
+        return self.aisle + list(self.queue)
 
     def add_passenger(self, passenger):
-        self.line.append(passenger)
+        self.queue.append(passenger)
 
     def is_onboarding(self):
-        if (len(self.line) > 0 and not all(passenger is None for passenger in self.line)):
+        if (len(self.queue) > 0 or not all(passenger is None for passenger in self.aisle)):
             return True
 
         return False
 
     def num_passengers_stalled(self):
         count = 0
-        for passenger in self.line:
+        for passenger in self.aisle:
             if passenger is not None and passenger.status == PassengerStatus.STALLED:
                 count += 1
 
+        if self.queue_status == PassengerStatus.STALLED:
+            count += len(self.queue)
+
         return count
 
     def num_passengers_moving(self):
         count = 0
-        for passenger in self.line:
+        for passenger in self.aisle:
             if passenger is not None and passenger.status == PassengerStatus.MOVING:
                 count += 1
 
+        if self.queue_status == PassengerStatus.MOVING:
+            count += len(self.queue)
+
         return count
 
     def move_forward(self):
 
-        for i, passenger in enumerate(self.line):
+        for i, passenger in enumerate(self.aisle):
             # Skip, if no passenger in that spot or
             #   passenger is at the front of the line or
             #   passenger is stowing luggage
@@ -103,17 +160,24 @@ class BoardingLine:
                 continue
 
             # Move passenger forward, if no one is blocking
-            if (passenger.status == PassengerStatus.STALLED or passenger.status == PassengerStatus.MOVING) and self.line[i-1] is None:
+            if (passenger.status == PassengerStatus.STALLED or passenger.status == PassengerStatus.MOVING) and self.aisle[i-1] is None:
                 passenger.status = PassengerStatus.MOVING
-                self.line[i-1] = passenger
-                self.line[i] = None
+                self.aisle[i-1] = passenger
+                self.aisle[i] = None
             else:
                 passenger.status = PassengerStatus.STALLED
 
-        # Truncate the empty spots at the end of the line
-        for i in range(len(self.line)-1, self.num_of_rows-1, -1):
-            if self.line[i] is None:
-                self.line.pop(i)
+        if len(self.queue) == 0:
+            return
+
+        # Front of the queue enters the airplane if the last aisle spot is free, the rest of the queue follows
+        if self.aisle[-1] is None:
+            passenger = self.queue.popleft()
+            passenger.status = PassengerStatus.MOVING
+            self.aisle[-1] = passenger
+            self.queue_status = PassengerStatus.MOVING
+        else:
+            self.queue_status = PassengerStatus.STALLED
 
 class Seat:
     def __init__(self, seat_num, row_num):
@@ -137,6 +201,10 @@ class Seat:
             self.passenger.status = PassengerStatus.SEATED
             return True
 
+    # Empties the seat
+    def reset(self):
+        self.passenger = None
+
     def __str__(self):
         if self.passenger is None:
             return f"S{self.seat_num:02d}"
@@ -149,6 +217,10 @@ class AirplaneRow:
         self.row_num = row_num
         self.seats = [Seat(row_num * seats_per_row + i, row_num) for i in range(seats_per_row)]
 
+    def reset(self):
+        for seat in self.seats:
+            seat.reset()
+
     def try_sit_passenger(self, passenger: Passenger):
         # Check if passenger's seat is in this row
         found_seats = list(filter(lambda seats: seats.seat_num == passenger.seat_num, self.seats))
@@ -163,12 +235,32 @@ class AirplaneRow:
 class AirplaneEnv(gym.Env):
     metadata = {'render_modes': ['human','terminal'], 'render_fps': 1}
 
-    def __init__(self, render_mode=None, num_of_rows=3, seats_per_row=5):
+    def __init__(self, render_mode=None, num_of_rows=3, seats_per_row=5, group_size=1, arrival_schedule=None, arrival_rate=None):
+
+        assert group_size >= 1, f"Invalid group size {group_size}"
 
         self.seats_per_row = seats_per_row
         self.num_of_rows = num_of_rows
         self.num_of_seats = num_of_rows * seats_per_row
 
+        # Number of passengers released from the chosen row per action (macro-action).
+        # With group_size > 1, one decision boards up to group_size passengers of that row,
+        # one per tick, and the rewards of the intervening ticks are summed.
+        self.group_size = group_size
+
+        # Streaming mode: passengers join the lobby over time instead of all being present at reset.
+        # arrival_schedule replays a fixed list of (tick, seat_num), arrival_rate samples a new
+        # schedule every episode with on average arrival_rate passengers arriving per tick.
+        assert arrival_rate is None or arrival_rate > 0, f"Invalid arrival rate {arrival_rate}"
+        self.arrival_schedule = arrival_schedule
+        self.arrival_rate = arrival_rate
+
+        # Every episode starts from the same layout, so the seats and passengers are created once
+        # and put back in their initial state on reset instead of being reallocated
+        self.airplane_rows = [AirplaneRow(row_num, self.seats_per_row) for row_num in range(self.num_of_rows)]
+        self.passengers = [Passenger(seat_num, seat_num // self.seats_per_row) for seat_num in range(self.num_of_seats)]
+        self.empty_observation = np.full(self.num_of_seats * 2, -1, dtype=np.int32)
+
         self.render_mode = render_mode
 
         # Define the Action space.
@@ -188,49 +280,88 @@ class AirplaneEnv(gym.Env):
     def reset(self, seed=None, options=None):
         super().reset(seed=seed) # gym requires this call to control randomness and reproduce scenarios.
 
-        self.airplane_rows = [AirplaneRow(row_num, self.seats_per_row) for row_num in range(self.num_of_rows)]
-        self.lobby = Lobby(self.num_of_rows, self.seats_per_row)
+        for row in self.airplane_rows:
+            row.reset()
+
+        for passenger in self.passengers:
+            passenger.reset()
+
+        self.lobby = Lobby(self.num_of_rows, self.seats_per_row, self._get_arrival_schedule(options), self.passengers)
         self.boarding_line = BoardingLine(self.num_of_rows)
 
+        # Seat numbers of the passengers that arrived since the last decision
+        self.tick = 0
+        self.arrived = [passenger.seat_num for passenger in self.lobby.admit_arrivals(self.tick)]
+        self._wait_for_arrival()
+
         self.render()
 
-        return self._get_observation(), {}
+        return self._get_observation(), {"arrivals": self.arrived}
+
+    # Returns the arrival schedule for the episode, or None if every passenger is present at reset.
+    # A schedule passed in reset(options={"arrival_schedule": ...}) replaces the one of the env for that episode.
+    def _get_arrival_schedule(self, options):
+        if options is not None and "arrival_schedule" in options:
+            return options["arrival_schedule"]
+
+        if self.arrival_schedule is not None:
+            return self.arrival_schedule
+
+        if self.arrival_rate is not None:
+            # Poisson arrivals in a random order
+            seat_nums = self.np_random.permutation(self.num_of_seats)
+            ticks = np.floor(np.cumsum(self.np_random.exponential(1 / self.arrival_rate, size=self.num_of_seats))).astype(int)
+            return list(zip(ticks.tolist(), seat_nums.tolist()))
+
+        return None
 
     # Returns an array of the number of passengers in line
     def _get_observation(self):
-        observation = []
-        for passenger in self.boarding_line.line:
+        line_length = self.num_of_rows + len(self.boarding_line.queue)
 
-            if passenger is None:
-                observation.append(-1)
-                observation.append(-1)
-            else:
-                observation.append(passenger.seat_num)
-                observation.append(passenger.status.value)
+        # Start from the empty line, only the occupied spots are filled in
+        if line_length <= self.num_of_seats:
+            observation = self.empty_observation.copy()
+        else:
+            observation = np.full(line_length * 2, -1, dtype=np.int32)
+
+        for i, passenger in enumerate(self.boarding_line.aisle):
+            if passenger is not None:
+                observation[2*i] = passenger.seat_num
+                observation[2*i+1] = passenger.status.value
 
-        for i in range(len(self.boarding_line.line), self.num_of_seats):
-            observation.append(-1)
-            observation.append(-1)
+        # Passengers outside of the airplane all share the queue's status
+        if len(self.boarding_line.queue) > 0:
+            observation[2*self.num_of_rows:2*line_length:2] = [passenger.seat_num for passenger in self.boarding_line.queue]
+            observation[2*self.num_of_rows+1:2*line_length:2] = self.boarding_line.queue_status.value
 
-        return np.array(observation, dtype=np.int32)
+        return observation
 
     def step(self, row_num):
         assert row_num>=0 and row_num<self.num_of_rows, f"Invalid row number {row_num}"
 
         reward = 0
+        self.arrived = []
+
+        # Board the group one passenger per tick, stop early if the row runs out of passengers
+        num_to_board = min(self.group_size, len(self.lobby.lobby_rows[row_num].passengers))
 
-        passenger = self.lobby.remove_passenger(row_num)
-        self.boarding_line.add_passenger(passenger)
+        for _ in range(num_to_board):
+            passenger = self.lobby.remove_passenger(row_num)
+            self.boarding_line.add_passenger(passenger)
 
-        # If there are passengers in the lobby, move the line once
-        if self.lobby.count_passengers()>0:
+            # Move the line once
             self._move()
-            reward = self._calculate_reward()
-        else:
-            # No more passengers in the lobby, so no more actions to choose from, move the line until all passengers are seated
-            while self.is_onboarding():
-                self._move()
-                reward += self._calculate_reward()
+            reward += self._calculate_reward()
+
+            # Lobby is empty but more passengers are on their way, move the line until the next one arrives
+            reward += self._wait_for_arrival()
+
+            if self.lobby.count_passengers()==0:
+                # No more passengers in the lobby, so no more actions to choose from, move the line until all passengers are seated
+                while self.is_onboarding():
+                    self._move()
+                    reward += self._calculate_reward()
 
         if self.is_onboarding():
             terminated = False
@@ -238,36 +369,51 @@ class AirplaneEnv(gym.Env):
             terminated = True
 
         # Gym requires returning the observation, reward, terminated, truncated, and info dictionary.
-        return self._get_observation(), reward, terminated, False, {}
+        return self._get_observation(), reward, terminated, False, {"arrivals": self.arrived}
 
     def _calculate_reward(self):
         reward = -self.boarding_line.num_passengers_stalled() #+ self.boarding_line.num_passengers_moving()
         return reward
 
     def is_onboarding(self):
-        # If there are passengers in the lobby or in the boarding line, return True
-        if self.lobby.count_passengers() > 0 or self.boarding_line.is_onboarding():
+        # If there are passengers in the lobby, on their way to the lobby or in the boarding line, return True
+        if self.lobby.count_passengers() > 0 or len(self.lobby.arrivals) > 0 or self.boarding_line.is_onboarding():
             return True
 
         return False
 
+    # Advances time until a passenger is in the lobby or no more passengers are expected, returns the reward of those ticks
+    def _wait_for_arrival(self):
+        reward = 0
+
+        while self.lobby.count_passengers() == 0 and len(self.lobby.arrivals) > 0:
+            if self.boarding_line.is_onboarding():
+                self._move()
+                reward += self._calculate_reward()
+            else:
+                # Nobody in line, so nothing changes until the next passenger arrives
+                self.tick = self.lobby.arrivals[0][0]
+                self.arrived += [passenger.seat_num for passenger in self.lobby.admit_arrivals(self.tick)]
+
+        return reward
+
     def _move(self):
 
-        for row_num, passenger in enumerate(self.boarding_line.line):
+        for row_num, passenger in enumerate(self.boarding_line.aisle):
             if passenger is None:
                 continue
 
-            # If outside of airplane's aisle
-            if row_num >= len(self.airplane_rows):
-                break
-
             # Try to sit passenger, if successful, remove from line
             if self.airplane_rows[row_num].try_sit_passenger(passenger):
-                self.boarding_line.line[row_num] = None
+                self.boarding_line.aisle[row_num] = None
 
         # Move line forward
         self.boarding_line.move_forward()
 
+        # Passengers arriving during this tick join the lobby
+        self.tick += 1
+        self.arrived += [passenger.seat_num for passenger in self.lobby.admit_arrivals(self.tick)]
+
         self.render()
 
     def render(self):
@@ -283,19 +429,17 @@ class AirplaneEnv(gym.Env):
             for seat in row.seats:
                 print(seat, end=" ")
 
-            if row.row_num < len(self.boarding_line.line):
-                passenger = self.boarding_line.line[row.row_num]
+            passenger = self.boarding_line.aisle[row.row_num]
 
-                status = "" if passenger is None else passenger.status
+            status = "" if passenger is None else passenger.status
 
-                print(f"| {passenger} {status}", end=" ")
+            print(f"| {passenger} {status}", end=" ")
 
             print()
 
         print("\nLine entering plane:")
-        for i in range(self.num_of_rows, len(self.boarding_line.line)):
-            passenger = self.boarding_line.line[i]
-            print(f"{passenger} {passenger.status}")
+        for passenger in self.boarding_line.queue:
+            print(f"{passenger} {self.boarding_line.queue_status}")
 
         print("\nLobby:")
         for row in self.lobby.lobby_rows:
@@ -0,0 +1,151 @@
+import gymnasium as gym
+from gymnasium import spaces
+import numpy as np
+import os
+from airplane_boarding import AirplaneEnv
+from agent import model_dir, log_dir
+from sb3_contrib import MaskablePPO
+
+from stable_baselines3.common.vec_env.subproc_vec_env import SubprocVecEnv
+from stable_baselines3.common.env_util import make_vec_env
+from sb3_contrib.common.maskable.callbacks import MaskableEvalCallback
+from stable_baselines3.common.callbacks import BaseCallback, CallbackList, StopTrainingOnNoModelImprovement
+
+# Aircraft sizes to train on, smallest first. The last stage is the target aircraft.
+default_stages = [
+    {"num_of_rows":3,  "seats_per_row":5},
+    {"num_of_rows":6,  "seats_per_row":5},
+    {"num_of_rows":10, "seats_per_row":5},
+]
+
+class PaddedAirplaneEnv(gym.Wrapper):
+    """
+    Maps an AirplaneEnv onto the observation and action spaces of a larger aircraft,
+    so a single policy can be trained on every stage of the curriculum.
+
+    Every spot of the padded observation means the same thing on every stage: spot i < max_rows is
+    aisle row i and spots from max_rows on are the queue outside of the aircraft. Aisle rows that
+    don't exist in the smaller aircraft stay empty, seat numbers are renumbered as if every row had
+    max_seats_per_row seats and the rows that don't exist are masked out.
+    On the largest aircraft the wrapper leaves the observation unchanged.
+    """
+    def __init__(self, env, max_rows, max_seats_per_row):
+        super().__init__(env)
+
+        airplane = env.unwrapped
+        assert airplane.num_of_rows <= max_rows, f"Aircraft has more than {max_rows} rows"
+        assert airplane.seats_per_row <= max_seats_per_row, f"Aircraft has more than {max_seats_per_row} seats per row"
+
+        self.max_rows = max_rows
+        self.max_seats_per_row = max_seats_per_row
+        max_seats = max_rows * max_seats_per_row
+
+        self.action_space = spaces.Discrete(max_rows)
+        self.observation_space = spaces.Box(
+            low=-1,
+            high=max_seats-1,
+            shape=(max_seats * 2,),
+            dtype=np.int32
+        )
+
+    def reset(self, seed=None, options=None):
+        observation, info = self.env.reset(seed=seed, options=options)
+        return self._pad_observation(observation), info
+
+    def step(self, row_num):
+        observation, reward, terminated, truncated, info = self.env.step(int(row_num))
+        return self._pad_observation(observation), reward, terminated, truncated, info
+
+    def _pad_observation(self, observation):
+        num_of_rows = self.env.unwrapped.num_of_rows
+        seats_per_row = self.env.unwrapped.seats_per_row
+
+        seat_nums = observation[0::2]
+        seat_nums = np.where(seat_nums >= 0, seat_nums // seats_per_row * self.max_seats_per_row + seat_nums % seats_per_row, -1)
+        statuses = observation[1::2]
+
+        padded = np.full(self.observation_space.shape, -1, dtype=np.int32)
+
+        # Aisle rows keep their spot, rows the smaller aircraft doesn't have stay empty
+        padded[0:2*num_of_rows:2] = seat_nums[:num_of_rows]
+        padded[1:2*num_of_rows:2] = statuses[:num_of_rows]
+
+        # The queue outside of the aircraft starts right behind the largest aircraft's aisle
+        queue_length = min(len(seat_nums) - num_of_rows, len(padded) // 2 - self.max_rows)
+        padded[2*self.max_rows:2*(self.max_rows+queue_length):2] = seat_nums[num_of_rows:num_of_rows+queue_length]
+        padded[2*self.max_rows+1:2*(self.max_rows+queue_length):2] = statuses[num_of_rows:num_of_rows+queue_length]
+        return padded
+
+    def action_masks(self) -> list[bool]:
+        mask = self.env.unwrapped.action_masks()
+        return mask + [False] * (self.max_rows - len(mask))
+
+class CurriculumStageCallback(BaseCallback):
+    """
+    Logs which curriculum stage is being trained, so the stage switches show up in TensorBoard.
+    """
+    def __init__(self, stage, env_kwargs, verbose=0):
+        super().__init__(verbose)
+        self.stage = stage
+        self.env_kwargs = env_kwargs
+        self.stage_start_timesteps = 0
+
+    def _on_training_start(self):
+        self.stage_start_timesteps = self.num_timesteps
+
+        if self.verbose >= 1:
+            print(f"Curriculum stage {self.stage}: {self.env_kwargs}")
+
+    def _on_rollout_end(self):
+        self.logger.record("curriculum/stage", self.stage)
+        self.logger.record("curriculum/num_of_rows", self.env_kwargs["num_of_rows"])
+        self.logger.record("curriculum/seats_per_row", self.env_kwargs["seats_per_row"])
+        self.logger.record("curriculum/stage_timesteps", self.num_timesteps - self.stage_start_timesteps)
+
+    def _on_step(self):
+        return True
+
+def train_curriculum(stages=default_stages, n_envs=12, max_no_improvement_evals=5, min_evals=5, max_timesteps_per_stage=int(1e10)):
+
+    max_rows = max(stage["num_of_rows"] for stage in stages)
+    max_seats_per_row = max(stage["seats_per_row"] for stage in stages)
+    wrapper_kwargs = {"max_rows":max_rows, "max_seats_per_row":max_seats_per_row}
+
+    model = None
+
+    for stage, env_kwargs in enumerate(stages):
+        env = make_vec_env(AirplaneEnv, n_envs=n_envs, env_kwargs=env_kwargs, vec_env_cls=SubprocVecEnv,
+                           wrapper_class=PaddedAirplaneEnv, wrapper_kwargs=wrapper_kwargs)
+
+        if model is None:
+            # Same settings as agent.train()
+            model = MaskablePPO('MlpPolicy', env, verbose=1, device='cpu', tensorboard_log=log_dir, ent_coef=0.05)
+        else:
+            # Every stage shares the padded spaces, so the weights carry over as is
+            model.set_env(env)
+
+        size = f"{env_kwargs['num_of_rows']}x{env_kwargs['seats_per_row']}"
+
+        # Move on to the next stage once the eval reward stops improving
+        eval_callback = MaskableEvalCallback(
+            env,
+            eval_freq=10_000,
+            callback_after_eval=StopTrainingOnNoModelImprovement(max_no_improvement_evals=max_no_improvement_evals, min_evals=min_evals, verbose=1),
+            verbose=1,
+            best_model_save_path=os.path.join(model_dir, 'MaskablePPO_curriculum', size),
+        )
+
+        # All stages are logged to the same TensorBoard run, curriculum/stage marks the switches
+        model.learn(
+            total_timesteps=max_timesteps_per_stage,
+            callback=CallbackList([CurriculumStageCallback(stage, env_kwargs, verbose=1), eval_callback]),
+            tb_log_name="Curriculum",
+            reset_num_timesteps=(stage == 0),
+        )
+
+        env.close()
+
+    return model
+
+if __name__ == '__main__':
+    train_curriculum()
@@ -0,0 +1,158 @@
+import numpy as np
+import os
+import time
+from airplane_boarding import AirplaneEnv
+from agent import model_dir
+from sb3_contrib import MaskablePPO
+
+class LookupTablePolicy:
+    """
+    State -> action table distilled from a MaskablePPO policy, answers without torch.
+
+    Observations are hashed by their raw bytes. States that were never seen during distillation
+    fall back to the valid row the original policy picked most often.
+    """
+    def __init__(self, num_of_rows):
+        self.num_of_rows = num_of_rows
+        self.table = {}
+        self.action_counts = np.zeros(num_of_rows, dtype=np.int64)
+        self.fallback_order = list(range(num_of_rows))
+
+    @staticmethod
+    def _key(observation):
+        return np.asarray(observation, dtype=np.int32).tobytes()
+
+    def add(self, observation, action):
+        self.table[self._key(observation)] = int(action)
+        self.action_counts[action] += 1
+
+    # Rows ordered by how often the original policy picked them, used for unseen states
+    def update_fallback(self):
+        self.fallback_order = np.argsort(-self.action_counts, kind='stable').tolist()
+
+    def predict(self, observation, action_masks):
+        action = self.table.get(self._key(observation))
+        if action is not None and action_masks[action]:
+            return action
+
+        for action in self.fallback_order:
+            if action_masks[action]:
+                return action
+
+        return 0
+
+    def save(self, path):
+        observations = np.array([np.frombuffer(key, dtype=np.int32) for key in self.table.keys()], dtype=np.int16)
+        actions = np.array(list(self.table.values()), dtype=np.uint16)
+        np.savez_compressed(path, observations=observations, actions=actions, action_counts=self.action_counts)
+
+    @classmethod
+    def load(cls, path):
+        data = np.load(path)
+        policy = cls(len(data["action_counts"]))
+
+        for observation, action in zip(data["observations"], data["actions"]):
+            policy.table[cls._key(observation)] = int(action)
+
+        policy.action_counts = data["action_counts"]
+        policy.update_fallback()
+        return policy
+
+# Runs episodes with the given policy and returns the visited observations, their masks and the total rewards
+def rollout(env, policy, num_episodes, seed=0):
+    observations = []
+    masks = []
+    rewards = []
+
+    for episode in range(num_episodes):
+        obs, _ = env.reset(seed=seed + episode)
+        terminated = False
+        total_reward = 0
+
+        while not terminated:
+            action_masks = env.action_masks()
+            observations.append(obs)
+            masks.append(action_masks)
+
+            obs, reward, terminated, _, _ = env.step(policy(obs, action_masks))
+            total_reward += reward
+
+        rewards.append(total_reward)
+
+    return np.array(observations), np.array(masks), rewards
+
+def distill(model_name='best_model', env_kwargs=None, num_episodes=100, dagger_iterations=3, eval_episodes=20):
+
+    if env_kwargs is None:
+        env_kwargs = {"num_of_rows":10, "seats_per_row":5}
+
+    env = AirplaneEnv(**env_kwargs)
+    model = MaskablePPO.load(os.path.join(model_dir, 'MaskablePPO', model_name), device='cpu')
+    table = LookupTablePolicy(env.num_of_rows)
+
+    def teacher(obs, action_masks):
+        action, _ = model.predict(observation=obs, deterministic=True, action_masks=action_masks)
+        return int(action)
+
+    def explorer(obs, action_masks):
+        action, _ = model.predict(observation=obs, deterministic=False, action_masks=action_masks)
+        return int(action)
+
+    def label(observations, masks):
+        # Label all states in one batched forward pass
+        actions, _ = model.predict(observation=observations, deterministic=True, action_masks=masks)
+        for obs, action in zip(observations, actions):
+            table.add(obs, action)
+
+        table.update_fallback()
+
+    # Fraction of states that aren't in the table (or whose stored row is masked), answered by fallback_order
+    def fallback_rate(observations, masks):
+        actions = [table.table.get(table._key(obs)) for obs in observations]
+        return np.mean([action is None or not action_masks[action] for action, action_masks in zip(actions, masks)])
+
+    # Start from the states the policy and a sampling version of it visit,
+    # then add the states the table itself runs into (DAgger)
+    for policy in (teacher, explorer):
+        observations, masks, _ = rollout(env, policy, num_episodes)
+        label(observations, masks)
+
+    for i in range(dagger_iterations):
+        observations, masks, _ = rollout(env, table.predict, num_episodes, seed=(i + 1) * num_episodes)
+        label(observations, masks)
+
+    # Episode reward of both policies on the same seeds. Without arrival_rate the env has no randomness,
+    # so every seed plays out the same episode.
+    seed = (dagger_iterations + 1) * num_episodes
+    _, _, teacher_rewards = rollout(env, teacher, eval_episodes, seed=seed)
+    observations, masks, table_rewards = rollout(env, table.predict, eval_episodes, seed=seed)
+    episode_fallback_rate = fallback_rate(observations, masks)
+
+    # Agreement is measured on held-out states from fresh sampling rollouts, these are not added to the table
+    observations, masks, _ = rollout(env, explorer, eval_episodes, seed=seed + eval_episodes)
+    held_out_fallback_rate = fallback_rate(observations, masks)
+
+    teacher_actions, _ = model.predict(observation=observations, deterministic=True, action_masks=masks)
+    start = time.perf_counter()
+    table_actions = [table.predict(obs, action_masks) for obs, action_masks in zip(observations, masks)]
+    table_latency = (time.perf_counter() - start) / len(observations)
+
+    start = time.perf_counter()
+    for obs, action_masks in zip(observations, masks):
+        teacher(obs, action_masks)
+    teacher_latency = (time.perf_counter() - start) / len(observations)
+
+    path = os.path.join(model_dir, 'MaskablePPO', f'{model_name}_table.npz')
+    table.save(path)
+
+    print(f"States in table: {len(table.table)}, saved to {path} ({os.path.getsize(path) / 1024:.1f} KB)")
+    print(f"Agreement with policy on {len(observations)} held-out states: {np.mean(np.array(table_actions) == teacher_actions):.1%} "
+          f"(fallback used for {held_out_fallback_rate:.1%})")
+    print(f"Mean episode reward: policy {np.mean(teacher_rewards):.2f}, table {np.mean(table_rewards):.2f} "
+          f"(change {np.mean(table_rewards) - np.mean(teacher_rewards):+.2f}, fallback used for {episode_fallback_rate:.1%} of decisions)")
+    print(f"Latency per decision: policy {teacher_latency * 1e6:.1f} us, table {table_latency * 1e6:.1f} us")
+
+    return table
+
+if __name__ == '__main__':
+    distill()
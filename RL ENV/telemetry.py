@@ -0,0 +1,180 @@
+import gymnasium as gym
+import numpy as np
+import os
+import time
+import psutil # Installed with stable-baselines3[extra]
+
+from stable_baselines3.common.callbacks import BaseCallback
+from stable_baselines3.common.vec_env import VecEnvWrapper
+
+class StepTimer(gym.Wrapper):
+    """
+    Reports how long each env.step takes inside the worker, as info["step_time"] in seconds.
+    """
+    def step(self, action):
+        start = time.perf_counter()
+        observation, reward, terminated, truncated, info = self.env.step(action)
+        info["step_time"] = time.perf_counter() - start
+        return observation, reward, terminated, truncated, info
+
+class TimedVecEnv(VecEnvWrapper):
+    """
+    Accumulates the time spent blocked on the vectorized env workers and retrieving action masks.
+    """
+    def __init__(self, venv):
+        super().__init__(venv)
+        self.env_wait_time = 0.0
+        self.mask_time = 0.0
+
+    def reset(self):
+        start = time.perf_counter()
+        observation = self.venv.reset()
+        self.env_wait_time += time.perf_counter() - start
+        return observation
+
+    def step_async(self, actions):
+        start = time.perf_counter()
+        self.venv.step_async(actions)
+        self.env_wait_time += time.perf_counter() - start
+
+    def step_wait(self):
+        start = time.perf_counter()
+        result = self.venv.step_wait()
+        self.env_wait_time += time.perf_counter() - start
+        return result
+
+    def env_method(self, method_name, *method_args, indices=None, **method_kwargs):
+        start = time.perf_counter()
+        result = self.venv.env_method(method_name, *method_args, indices=indices, **method_kwargs)
+
+        # MaskablePPO calls action_masks() on every env before each step
+        if method_name == "action_masks":
+            self.mask_time += time.perf_counter() - start
+
+        return result
+
+class ThroughputTelemetryCallback(BaseCallback):
+    """
+    Breaks each training iteration down into where the wall time went and logs it under telemetry/:
+    rollout collection, waiting on the env workers, action mask retrieval, policy forward passes,
+    the eval callback, and the gradient update epochs of the previous iteration. Also logs the step
+    latency of every worker and the resident memory of the main and worker processes.
+
+    The training env has to be wrapped in TimedVecEnv, and its envs in StepTimer for the per-worker latency.
+    Wraps the eval callback (or any other callback) so its time isn't counted as rollout time.
+    """
+    def __init__(self, callback=None, verbose=0):
+        super().__init__(verbose)
+        self.callback = callback
+
+    def _init_callback(self):
+        assert isinstance(self.training_env, TimedVecEnv), "ThroughputTelemetryCallback needs the training env wrapped in TimedVecEnv"
+
+        if self.callback is not None:
+            self.callback.init_callback(self.model)
+
+        self.processes = [psutil.Process(os.getpid())]
+        self.processes += [psutil.Process(process.pid) for process in getattr(self.training_env.venv, "processes", [])]
+
+        self.forward_time = 0.0
+        self.forward_start = None
+        self.eval_time = 0.0
+        self.rollout_start = None
+        self.rollout_end = None
+        self.update_time = None
+        self.worker_step_times = [[] for _ in range(self.training_env.num_envs)]
+
+    # Times the policy forward passes. Only collect_rollouts() calls the policy directly,
+    # the update epochs and model.predict() in evaluation go through other methods.
+    def _forward_pre_hook(self, module, args):
+        self.forward_start = time.perf_counter()
+
+    def _forward_hook(self, module, args, output):
+        self.forward_time += time.perf_counter() - self.forward_start
+
+    def _on_training_start(self):
+        self.hooks = [
+            self.model.policy.register_forward_pre_hook(self._forward_pre_hook),
+            self.model.policy.register_forward_hook(self._forward_hook),
+        ]
+
+        if self.callback is not None:
+            self.callback.on_training_start(self.locals, self.globals)
+
+    def _on_rollout_start(self):
+        self.rollout_start = time.perf_counter()
+
+        # Everything between the end of the last rollout and now is the update of the last iteration
+        if self.rollout_end is not None:
+            self.update_time = self.rollout_start - self.rollout_end
+
+        self.env_wait_start = self.training_env.env_wait_time
+        self.mask_start = self.training_env.mask_time
+        self.forward_time = 0.0
+        self.eval_time = 0.0
+
+        if self.callback is not None:
+            self.callback.on_rollout_start()
+
+    def _on_step(self):
+        for i, info in enumerate(self.locals["infos"]):
+            if "step_time" in info:
+                self.worker_step_times[i].append(info["step_time"])
+
+        if self.callback is None:
+            return True
+
+        # The eval callback steps the same env, so its env and mask time is taken out of the rollout's
+        env_wait_time = self.training_env.env_wait_time
+        mask_time = self.training_env.mask_time
+        start = time.perf_counter()
+
+        continue_training = self.callback.on_step()
+
+        self.eval_time += time.perf_counter() - start
+        self.env_wait_start += self.training_env.env_wait_time - env_wait_time
+        self.mask_start += self.training_env.mask_time - mask_time
+
+        return continue_training
+
+    def update_child_locals(self, locals_):
+        if self.callback is not None:
+            self.callback.update_locals(locals_)
+
+    def _on_rollout_end(self):
+        self.rollout_end = time.perf_counter()
+
+        if self.callback is not None:
+            self.callback.on_rollout_end()
+
+        env_wait_time = self.training_env.env_wait_time - self.env_wait_start
+        mask_time = self.training_env.mask_time - self.mask_start
+
+        self.logger.record("telemetry/rollout_time", self.rollout_end - self.rollout_start - self.eval_time)
+        self.logger.record("telemetry/env_wait_time", env_wait_time)
+        self.logger.record("telemetry/mask_time", mask_time)
+        self.logger.record("telemetry/forward_time", self.forward_time)
+        self.logger.record("telemetry/eval_time", self.eval_time)
+
+        if self.update_time is not None:
+            self.logger.record("telemetry/update_time", self.update_time)
+
+        for i, step_times in enumerate(self.worker_step_times):
+            if len(step_times) > 0:
+                self.logger.record(f"telemetry/worker_{i}_step_ms", np.mean(step_times) * 1000)
+                step_times.clear()
+
+        # Resident memory of the main process and of every worker
+        for i, process in enumerate(self.processes):
+            name = "main" if i == 0 else f"worker_{i-1}"
+            try:
+                self.logger.record(f"telemetry/rss_{name}_mb", process.memory_info().rss / 1024**2)
+            except psutil.NoSuchProcess:
+                pass
+
+    def _on_training_end(self):
+        for hook in self.hooks:
+            hook.remove()
+
+        if self.callback is not None:
+            self.callback.on_training_end()